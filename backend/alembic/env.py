@@ -12,7 +12,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 # Import settings and models
-from app.core.config import settings
+from app.core.config import get_settings
 from app.core.database import Base
 from app.models.user import User  # Import all models
 
@@ -20,7 +20,7 @@ from app.models.user import User  # Import all models
 config = context.config
 
 # Set database URL from .env file
-config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+config.set_main_option("sqlalchemy.url", get_settings().DATABASE_URL)
 
 # Interpret the config file for Python logging.
 if config.config_file_name is not None:
@@ -0,0 +1,34 @@
+"""Add covering email index
+
+Revision ID: 4c1e8f2a9b7d
+Revises: 90b26acc7348
+Create Date: 2026-10-15 06:15:02.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e8f2a9b7d'
+down_revision = '90b26acc7348'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Unique index on email that also carries the columns read on login,
+    # letting PostgreSQL serve those lookups with an index-only scan
+    op.create_index(
+        'ix_users_email_cover',
+        'users',
+        ['email'],
+        unique=True,
+        postgresql_include=['id', 'hashed_password', 'is_active']
+    )
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.drop_index('ix_users_email_cover', table_name='users')
@@ -3,18 +3,32 @@ Dependencies for API endpoints (dependency injection).
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.core.security import decode_access_token
 from app.models.user import User
+from app.services.user_cache import get_cached_user, cache_user
 
 # Security scheme for JWT Bearer token
 security = HTTPBearer()
 
+# Built once and reused by every authenticated request
+CREDENTIALS_EXCEPTION = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def _credentials_error() -> HTTPException:
+    # Reset the traceback so repeated raises don't chain frames onto the shared instance
+    return CREDENTIALS_EXCEPTION.with_traceback(None)
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     Retrieves currently logged-in user based on JWT token.
@@ -27,26 +41,26 @@ async def get_current_user(
         User: User object from database
         
     Raises:
-        HTTPException: 401 if token is invalid or user doesn't exist
+        HTTPException: 401 if token is invalid or user doesn't exist,
+            400 if user is inactive
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
     # Decode token
-    token = credentials.credentials
-    email = decode_access_token(token)
+    email = decode_access_token(credentials.credentials)
     
     if email is None:
-        raise credentials_exception
+        raise _credentials_error()
     
-    # Get user from database
-    user = db.query(User).filter(User.email == email).first()
+    # Get user from cache, falling back to database
+    user = await get_cached_user(db, email)
     
     if user is None:
-        raise credentials_exception
+        result = await db.execute(select(User).filter_by(email=email))
+        user = result.scalar_one_or_none()
+        
+        if user is None:
+            raise _credentials_error()
+        
+        await cache_user(user)
     
     if not user.is_active:
         raise HTTPException(
@@ -56,25 +70,3 @@ async def get_current_user(
     
     return user
 
-
-async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
-    """
-    Checks if user is active.
-    
-    Args:
-        current_user: Current user
-        
-    Returns:
-        User: Active user
-        
-    Raises:
-        HTTPException: 400 if user is inactive
-    """
-    if not current_user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User account is inactive"
-        )
-    return current_user
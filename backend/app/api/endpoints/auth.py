@@ -1,21 +1,29 @@
 """
 Authentication-related endpoints (registration, login).
 """
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
-from datetime import timedelta
+import asyncio
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_password_hash, verify_password, create_access_token
-from app.core.config import settings
+from app.core.security import get_password_hash, verify_password, password_needs_rehash, create_access_token
 from app.models.user import User
 from app.schemas.user import UserCreate, UserLogin
 from app.schemas.auth import RegisterResponse, LoginResponse, ErrorResponse, LoginRequest, Verify2FARequest
-from app.services.twofa_service import send_2fa_code_via_email, verify_code, generate_tmp_token
-from jose import jwt, JWTError, ExpiredSignatureError
+from app.services.twofa_service import send_2fa_code_via_email, verify_code, generate_tmp_token, decode_tmp_token
+from app.services.user_cache import invalidate_user
+import jwt
 
 router = APIRouter()
 
+# Verified against when the email is unknown, so response time
+# doesn't reveal which emails are registered (computing it at import
+# also warms up the hasher before the first real login)
+DUMMY_PASSWORD_HASH = get_password_hash("dummy-password-for-timing")
+
 
 @router.post(
     "/register",
@@ -29,16 +37,15 @@ router = APIRouter()
 )
 async def register(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Register a new user in the system.
     
     **Process:**
     1. Input data validation (email, password min. 8 characters)
-    2. Check if user with this email already exists
-    3. Hash password using bcrypt
-    4. Create new user in database
+    2. Hash password using Argon2id
+    3. Create new user in database (email uniqueness enforced by database)
     
     **Parameters:**
     - **email**: Unique user email address
@@ -49,31 +56,32 @@ async def register(
     - User email
     - Confirmation message
     """
-    # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User with this email already exists"
-        )
-    
-    # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    # Hash password (CPU-bound, run in a worker thread to keep the event loop free)
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
     
     # Create new user
     new_user = User(
         email=user_data.email,
         hashed_password=hashed_password,
-        is_active=True
+        is_active=True,
+        updated_at=None  # set explicitly so eager_defaults doesn't SELECT it after INSERT
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    
+    # Unique index on email rejects duplicates, no pre-check query needed
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User with this email already exists"
+        )
     
     return RegisterResponse(
         id=new_user.id,
-        email=new_user.email,
+        email=user_data.email,
         message="User successfully registered"
     )
 
@@ -82,17 +90,49 @@ async def register(
 # LOGIN (STEP 1 — send 2FA)
 # -----------------------------
 @router.post("/login")
-async def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
+async def login(
+    payload: LoginRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
+):
+    # Only the columns needed here, without hydrating a full ORM entity
+    result = await db.execute(
+        select(User.id, User.email, User.hashed_password, User.is_active)
+        .where(User.email == payload.email)
+    )
+    row = result.first()
 
-    if not user or not verify_password(payload.password, user.hashed_password):
+    hash_to_check = row.hashed_password if row is not None else DUMMY_PASSWORD_HASH
+    password_ok = await asyncio.to_thread(verify_password, payload.password, hash_to_check)
+
+    if row is None or not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Send 2FA code
-    await send_2fa_code_via_email(user)
+    if not row.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User account is inactive"
+        )
+
+    # Upgrade legacy bcrypt hashes and outdated Argon2 parameters
+    if password_needs_rehash(row.hashed_password):
+        new_hash = await asyncio.to_thread(get_password_hash, payload.password)
+        await db.execute(
+            update(User)
+            .where(User.id == row.id)
+            .values(hashed_password=new_hash)
+        )
+        await db.commit()
+        await invalidate_user(row.email)
+
+    # Return the connection to the pool before the Redis round-trip
+    await db.close()
+
+    # Store 2FA code and queue the email
+    await send_2fa_code_via_email(row.id, row.email, background_tasks)
 
     # Create tmp token
-    tmp_token = generate_tmp_token(user.id)
+    tmp_token = generate_tmp_token(row.id)
 
     return {"detail": "2fa_required", "tmp_token": tmp_token}
 
@@ -101,12 +141,16 @@ async def login(payload: LoginRequest, db: Session = Depends(get_db)):
 # VERIFY 2FA (STEP 2 — get JWT)
 # -----------------------------
 @router.post("/verify-2fa")
-async def verify_2fa(payload: Verify2FARequest, request: Request, db: Session = Depends(get_db)):
+async def verify_2fa(
+    payload: Verify2FARequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
     try:
-        decoded = jwt.decode(payload.tmp_token, settings.SECRET_KEY, algorithms=["HS256"])
-    except ExpiredSignatureError:
+        decoded = decode_tmp_token(payload.tmp_token)
+    except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="tmp_token has expired")
-    except JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid tmp_token")
 
     user_id = decoded.get("user_id")
@@ -117,13 +161,13 @@ async def verify_2fa(payload: Verify2FARequest, request: Request, db: Session =
 
     await verify_code(user_id, payload.code, ip)
 
-    # produce final JWT
-    user = db.query(User).filter(User.id == user_id).first()
+    # produce final JWT (single primary-key lookup, served from the identity map when possible)
+    user = await db.get(User, int(user_id))
+    if user is None or not user.is_active:
+        # Deleted or deactivated between login and verification
+        raise HTTPException(status_code=401, detail="Invalid tmp_token")
 
-    token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    token = create_access_token(data={"sub": user.email})
 
     return {"access_token": token, "token_type": "bearer"}
 
@@ -1,15 +1,19 @@
 """
 User management-related endpoints.
 """
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
 from app.core.security import get_password_hash, verify_password
-from app.api.deps import get_current_active_user
+from app.api.deps import get_current_user
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
 from app.schemas.auth import ErrorResponse
+from app.services.user_cache import invalidate_user
 
 router = APIRouter()
 
@@ -24,7 +28,7 @@ router = APIRouter()
     }
 )
 async def get_profile(
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Retrieves currently logged-in user's profile data.
@@ -59,8 +63,8 @@ async def get_profile(
 )
 async def update_profile(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Updates user profile data.
@@ -83,28 +87,29 @@ async def update_profile(
     if not user_update.email and not user_update.password:
         return current_user
     
+    old_email = current_user.email
+    
     # Update email
     if user_update.email and user_update.email != current_user.email:
-        # Check if new email is not already taken
-        existing_user = db.query(User).filter(
-            User.email == user_update.email,
-            User.id != current_user.id
-        ).first()
-        
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User with this email already exists"
-            )
-        
         current_user.email = user_update.email
     
     # Update password
     if user_update.password:
-        current_user.hashed_password = get_password_hash(user_update.password)
-    
-    db.commit()
-    db.refresh(current_user)
+        current_user.hashed_password = await asyncio.to_thread(
+            get_password_hash, user_update.password
+        )
+    
+    # Unique index on email rejects addresses already taken
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User with this email already exists"
+        )
+    
+    await invalidate_user(old_email)
     
     return current_user
 
@@ -119,8 +124,8 @@ async def update_profile(
     }
 )
 async def delete_account(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Deletes currently logged-in user's account.
@@ -132,12 +137,16 @@ async def delete_account(
     **Alternative:** Account deactivation instead of deletion
     (setting is_active = False)
     """
+    email = current_user.email
+    
     # Option 1: Complete user deletion
-    db.delete(current_user)
-    db.commit()
+    await db.delete(current_user)
+    await db.commit()
+    
+    await invalidate_user(email)
     
     # Option 2 (recommended): Account deactivation
     # current_user.is_active = False
-    # db.commit()
+    # await db.commit()
     
     return {"message": "Account successfully deleted"}
@@ -1,6 +1,7 @@
 """
 Application configuration and environment variables.
 """
+from functools import cached_property, lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import EmailStr, AnyUrl
 from typing import List, Optional
@@ -16,23 +17,28 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     API_V1_PREFIX: str = "/api"
     
-    model_config = {
-        "env_file": ".env",
-        "case_sensitive": True
-    }
-    
     # Database
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE: int = 1800  # in seconds
+    DB_POOL_TIMEOUT: int = 5     # in seconds
+    SQL_ECHO: bool = False       # log every SQL statement (expensive)
     
     # JWT
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Password hashing (Argon2id, OWASP defaults; tune with tests/bench_hash.py)
+    ARGON2_MEMORY_COST: int = 19456  # in KiB (19 MiB)
+    ARGON2_TIME_COST: int = 2
+    ARGON2_PARALLELISM: int = 1
+    
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:8501"
     
-    # Email configuration (FastAPI-Mail-compatible)
+    # Email configuration (SMTP, see app/core/mail.py)
     MAIL_USERNAME: Optional[str] = None
     MAIL_PASSWORD: Optional[str] = None
     MAIL_FROM: Optional[EmailStr] = None
@@ -54,12 +60,22 @@ class Settings(BaseSettings):
     
     # Redis (optional)
     REDIS_URL: Optional[AnyUrl] = None  # e.g. redis://redis:6379/0
+    REDIS_MAX_CONNECTIONS: int = 64
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # in seconds
     
-    @property
+    @cached_property
     def cors_origins(self) -> List[str]:
-        """Returns list of allowed origins for CORS."""
+        """Returns list of allowed origins for CORS (parsed once)."""
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
 
 
-# Singleton settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Returns the settings singleton, created on first use.
+    
+    Modules bind the result at import time (settings = get_settings()), so
+    .env is read when the application is imported and cache_clear() does
+    not reach those copies.
+    """
+    return Settings()
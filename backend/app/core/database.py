@@ -1,35 +1,39 @@
 """
 PostgreSQL database connection configuration.
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.config import settings
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from app.core.config import get_settings
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
+settings = get_settings()
+
+# Create async database engine (asyncpg driver)
+engine = create_async_engine(
+    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1),
     pool_pre_ping=True,  # Check connection before use
-    echo=settings.DEBUG   # Log SQL queries in debug mode
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,  # Drop connections before server-side timeouts
+    pool_timeout=settings.DB_POOL_TIMEOUT,  # Fail fast when the pool is exhausted
+    echo=settings.SQL_ECHO   # Log SQL queries (independent of DEBUG)
 )
 
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: attributes can't be lazily reloaded in async code
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
+async def get_db():
     """
     Dependency injection for database session.
     
     Yields:
-        Session: Database session
+        AsyncSession: Database session
         
     Ensures automatic session closure after request completion.
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
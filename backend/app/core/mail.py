@@ -0,0 +1,74 @@
+"""
+SMTP client configuration.
+"""
+import asyncio
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Optional
+
+import aiosmtplib
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# One SMTP session shared by all sends (TLS handshake and login happen once);
+# the lock keeps concurrent sends from interleaving on it
+_smtp: Optional[aiosmtplib.SMTP] = None
+_smtp_lock = asyncio.Lock()
+
+
+async def _connect() -> aiosmtplib.SMTP:
+    use_credentials = bool(settings.MAIL_USERNAME)
+    smtp = aiosmtplib.SMTP(
+        hostname=settings.MAIL_SERVER,
+        port=settings.MAIL_PORT,
+        username=settings.MAIL_USERNAME if use_credentials else None,
+        password=settings.MAIL_PASSWORD if use_credentials else None,
+        use_tls=settings.MAIL_SSL_TLS,
+        start_tls=settings.MAIL_STARTTLS,
+    )
+    await smtp.connect()
+    return smtp
+
+
+async def send_mail(recipient: str, subject: str, body: str) -> None:
+    """
+    Sends a plain-text email over the shared SMTP connection.
+
+    Connects on first use and reconnects once if the server has dropped
+    the idle session.
+
+    Args:
+        recipient: Destination address
+        subject: Message subject
+        body: Plain-text body
+    """
+    global _smtp
+
+    msg = EmailMessage()
+    msg["From"] = formataddr((settings.MAIL_FROM_NAME, settings.MAIL_FROM))
+    msg["To"] = recipient
+    msg["Subject"] = subject
+    msg.set_content(body)
+
+    async with _smtp_lock:
+        if _smtp is None or not _smtp.is_connected:
+            _smtp = await _connect()
+        try:
+            await _smtp.send_message(msg)
+        except aiosmtplib.SMTPServerDisconnected:
+            _smtp = await _connect()
+            await _smtp.send_message(msg)
+
+
+async def close_mail() -> None:
+    """Closes the shared SMTP connection (called on application shutdown)."""
+    global _smtp
+
+    async with _smtp_lock:
+        if _smtp is not None and _smtp.is_connected:
+            try:
+                await _smtp.quit()
+            except aiosmtplib.SMTPException:
+                _smtp.close()
+        _smtp = None
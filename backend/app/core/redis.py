@@ -0,0 +1,17 @@
+"""
+Redis client configuration.
+"""
+import redis.asyncio as redis_async
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Shared Redis client backed by one bounded pool; connections are opened
+# lazily and kept warm. redis-py picks the C hiredis parser when installed.
+# Replies stay raw bytes - callers compare/parse them without a str decode.
+REDIS = redis_async.Redis.from_url(
+    str(settings.REDIS_URL),
+    decode_responses=False,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+)
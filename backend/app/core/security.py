@@ -1,14 +1,37 @@
 """
 Security-related functions: password hashing, JWT.
 """
-from datetime import datetime, timedelta, timezone
+import base64
+import hashlib
+import hmac
+import time
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, ExpiredSignatureError, jwt
-from passlib.context import CryptContext
-from app.core.config import settings
+import bcrypt
+import orjson
+from argon2 import PasswordHasher, Type
+from argon2.exceptions import VerificationError, InvalidHashError
+import jwt
+from app.core.config import get_settings
 
-# Context for password hashing with bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+settings = get_settings()
+
+# JWT signing key, encoded once instead of on every encode/decode
+SIGNING_KEY = settings.SECRET_KEY.encode('utf-8')
+
+# Base64url of the constant header {"alg":"HS256","typ":"JWT"}
+_HS256_HEADER_B64 = b"eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"
+
+# HMAC state with the key already absorbed; each signature works on a copy
+_HS256_MAC = hmac.new(SIGNING_KEY, digestmod=hashlib.sha256)
+
+# Argon2id hasher for new passwords (bcrypt is kept only to verify legacy hashes)
+password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+    type=Type.ID,
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -17,32 +40,48 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     
     Args:
         plain_password: Password in plain text
-        hashed_password: Hashed password from database
+        hashed_password: Hashed password from database (Argon2id or legacy bcrypt)
         
     Returns:
         bool: True if passwords match, False otherwise
     """
-    # Bcrypt has a 72-byte limit - truncate password if longer
+    if hashed_password.startswith("$argon2"):
+        try:
+            return password_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    # Legacy bcrypt hash - bcrypt has a 72-byte limit, truncate password if longer
     password_bytes = plain_password.encode('utf-8')[:72]
-    return pwd_context.verify(password_bytes, hashed_password)
+    return bcrypt.checkpw(password_bytes, hashed_password.encode('utf-8'))
 
 
 def get_password_hash(password: str) -> str:
     """
-    Hashes password using bcrypt.
+    Hashes password using Argon2id.
     
     Args:
         password: Password in plain text
         
     Returns:
         str: Hashed password
+    """
+    return password_hasher.hash(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Checks if the hash is legacy bcrypt or uses outdated Argon2 parameters.
+    
+    Args:
+        hashed_password: Hashed password from database
         
-    Note:
-        Bcrypt has a 72-byte limit. Longer passwords are automatically truncated.
+    Returns:
+        bool: True if password should be hashed again with current settings
     """
-    # Bcrypt has a 72-byte limit - truncate password if longer
-    password_bytes = password.encode('utf-8')[:72]
-    return pwd_context.hash(password_bytes)
+    if not hashed_password.startswith("$argon2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -58,17 +97,45 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     """
     to_encode = data.copy()
     
+    # "exp" as int epoch seconds - no datetime objects on the request path
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        lifetime = int(expires_delta.total_seconds())
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        lifetime = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    to_encode["exp"] = int(time.time()) + lifetime
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=settings.ALGORITHM)
     
     return encoded_jwt
 
 
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def encode_hs256_token(payload: dict) -> str:
+    """
+    Creates an HS256 JWT with a precomputed header.
+    
+    Skips the per-call header serialization, algorithm lookup and key
+    preparation of jwt.encode.
+    Tokens are standard JWTs and decode with jwt.decode. Unlike jwt.encode,
+    datetime claims are not converted - meant for internal payloads of plain
+    ints and strings (tmp_token).
+    
+    Args:
+        payload: JSON-serializable claims (e.g. "exp" as int timestamp)
+        
+    Returns:
+        str: Encoded JWT token
+    """
+    signing_input = _HS256_HEADER_B64 + b"." + _b64url(orjson.dumps(payload))
+    mac = _HS256_MAC.copy()
+    mac.update(signing_input)
+    signature = mac.digest()
+    return (signing_input + b"." + _b64url(signature)).decode('ascii')
+
+
 def decode_access_token(token: str) -> Optional[str]:
     """
     Decodes JWT token and returns user email.
@@ -80,12 +147,17 @@ def decode_access_token(token: str) -> Optional[str]:
         Optional[str]: User email or None if token is invalid
     """
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(
+            token,
+            SIGNING_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={"require": ["exp", "sub"]}
+        )
         email: str = payload.get("sub")
         
         if email is None:
             return None
             
         return email
-    except JWTError:
+    except jwt.InvalidTokenError:
         return None
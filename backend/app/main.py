@@ -1,18 +1,32 @@
 """
 Main FastAPI application file.
 """
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.config import settings
+from app.core.config import get_settings
+from app.core.mail import close_mail
 from app.api.endpoints import auth, users
 
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the persistent SMTP session
+    await close_mail()
+
+
 # Initialize FastAPI application
 app = FastAPI(
     title=settings.APP_NAME,
     description="API for Two-Factor Authentication (2FA) application",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -1,7 +1,7 @@
 """
 User model for database.
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -13,15 +13,28 @@ class User(Base):
     Attributes:
         id: Unique user identifier
         email: Email address (unique)
-        hashed_password: Hashed password (bcrypt)
+        hashed_password: Hashed password (Argon2id, legacy bcrypt)
         is_active: Account activity status
         created_at: Account creation date
         updated_at: Last update date
     """
     __tablename__ = "users"
+    # Fetch server-generated values (id, created_at, updated_at) with RETURNING
+    # during flush instead of a separate SELECT afterwards
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Unique email index covering the columns read by auth lookups,
+        # so PostgreSQL can answer them with an index-only scan
+        Index(
+            "ix_users_email_cover",
+            "email",
+            unique=True,
+            postgresql_include=["id", "hashed_password", "is_active"],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, index=True, nullable=False)
+    email = Column(String(255), nullable=False)
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
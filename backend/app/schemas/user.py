@@ -16,8 +16,8 @@ class UserCreate(UserBase):
     password: str = Field(
         ..., 
         min_length=8,
-        max_length=72,
-        description="User password (min. 8 characters, max. 72 - bcrypt limit)"
+        max_length=128,
+        description="User password (min. 8 characters, max. 128 - bounds hashing input)"
     )
 
 
@@ -32,8 +32,8 @@ class UserUpdate(BaseModel):
     password: Optional[str] = Field(
         None,
         min_length=8,
-        max_length=72,
-        description="New password (min. 8 characters, max. 72 - bcrypt limit)"
+        max_length=128,
+        description="New password (min. 8 characters, max. 128 - bounds hashing input)"
     )
 
 
@@ -1,132 +1,205 @@
 # app/services/twofa_service.py
-import json
-import secrets
-from datetime import datetime, timedelta
+import os
+import time
+from functools import lru_cache
 
-from fastapi import HTTPException, status, Request
-from jose import jwt
-import redis.asyncio as redis_async
+from fastapi import BackgroundTasks, HTTPException, status, Request
+from cachetools import TTLCache
+import jwt
 
-from app.core.config import settings
-from app.core.security import create_access_token
-from app.models.user import User
+from app.core.config import get_settings
+from app.core.mail import send_mail
+from app.core.redis import REDIS
+from app.core.security import SIGNING_KEY, encode_hs256_token
 
-# Redis client
-REDIS = redis_async.from_url(str(settings.REDIS_URL), decode_responses=True)
+settings = get_settings()
 
-def _code_key(user_id: int) -> str:
-    return f"2fa:code:{user_id}"
+# Decoded tmp_tokens - the same token is re-submitted after each mistyped code
+_tmp_token_cache = TTLCache(maxsize=10_000, ttl=60)
 
-def _attempt_key(user_id: int) -> str:
-    return f"2fa:attempts:{user_id}"
+# (user_id, code, ip) verified moments ago - a double-submitted form
+# succeeds again without another Redis round-trip
+_recent_verifications = TTLCache(maxsize=10_000, ttl=2)
 
-def _block_user_key(user_id: int) -> str:
-    return f"2fa:block:user:{user_id}"
+# Keys are built once per user/ip and passed to Redis as bytes (no re-encoding)
+@lru_cache(maxsize=8192)
+def _code_key(user_id: int) -> bytes:
+    return b"2fa:code:%d" % user_id
 
-def _block_ip_key(ip: str) -> str:
-    return f"2fa:block:ip:{ip}"
+@lru_cache(maxsize=8192)
+def _attempt_key(user_id: int) -> bytes:
+    return b"2fa:attempts:%d" % user_id
 
-def _generate_code() -> str:
-    return str(secrets.randbelow(1_000_000)).zfill(6)
-
-async def _is_blocked(user_id: int, ip: str):
-    user_block = await REDIS.get(_block_user_key(user_id))
-    ip_block = await REDIS.get(_block_ip_key(ip))
-    return user_block or ip_block
-
-async def _increase_block(user_id: int, ip: str):
-    """Progressive block time: 30m → 1h → 8h → 24h."""
-    times = [30, 60, 480, 1440]  # in minutes
-
-    current = await REDIS.get(_block_user_key(user_id))
-    level = int(current) if current else 0
-    level = min(level, len(times) - 1)
-
-    block_minutes = times[level]
+@lru_cache(maxsize=8192)
+def _block_user_key(user_id: int) -> bytes:
+    return b"2fa:block:user:%d" % user_id
 
-    await REDIS.set(_block_user_key(user_id), level + 1, ex=block_minutes * 60)
-    await REDIS.set(_block_ip_key(ip), level + 1, ex=block_minutes * 60)
+@lru_cache(maxsize=8192)
+def _block_ip_key(ip: str) -> bytes:
+    return b"2fa:block:ip:" + ip.encode()
 
-async def send_2fa_code_via_email(user: User):
-    existing = await REDIS.get(_code_key(user.id))
-
-    now = datetime.utcnow()
-
-    if existing:
-        payload = json.loads(existing)
-        last_sent = datetime.fromisoformat(payload["last_sent"])
-        if (now - last_sent).total_seconds() < settings.TWO_FA_RESEND_SECONDS:
-            raise HTTPException(
-                status_code=429,
-                detail="Please wait before requesting another code."
-            )
+@lru_cache(maxsize=8192)
+def _block_level_key(user_id: int) -> bytes:
+    return b"2fa:block_level:user:%d" % user_id
 
+def _generate_code() -> str:
+    # 32 random bits reduced mod 10^6: single draw, bias below 0.03%
+    return f"{int.from_bytes(os.urandom(4), 'big') % 1_000_000:06d}"
+
+# Progressive block time: 30m → 1h → 8h → 24h
+BLOCK_TIMES_MINUTES = [30, 60, 480, 1440]
+# Same list as passed to the verify script (ARGV), built once
+_BLOCK_TIMES_ARG = ",".join(map(str, BLOCK_TIMES_MINUTES))
+
+# Resend throttle in one round-trip: refuse if the previous code is too recent,
+# otherwise store the new one.
+# The code is stored as a hash {code, last_sent} - fields are read directly, no JSON.
+# KEYS: code
+# ARGV: new code, send time (epoch seconds), resend interval (seconds), entry TTL
+SEND_CODE_LUA = """
+local last_sent = tonumber(redis.call('HGET', KEYS[1], 'last_sent'))
+if last_sent and tonumber(ARGV[2]) - last_sent < tonumber(ARGV[3]) then
+    return 'too_soon'
+end
+redis.call('HSET', KEYS[1], 'code', ARGV[1], 'last_sent', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 'ok'
+"""
+
+# Whole verification in one round-trip, atomically (no race between
+# counting attempts and checking blocks).
+# The block level lives in its own key that outlasts the block itself, so a
+# repeat offender climbs the ladder; it resets a full top-level period after
+# the last block ends.
+# KEYS: code, attempts, user block, ip block, user block level
+# ARGV: submitted code, attempts TTL, max attempts, block times (minutes, CSV)
+VERIFY_CODE_LUA = """
+-- Always checked: the attempts key is cleared when a block starts and the
+-- ip block may come from another account, so neither is a safe shortcut.
+-- Inside the script this is one MGET, not an extra round-trip.
+local blocks = redis.call('MGET', KEYS[3], KEYS[4])
+if blocks[1] or blocks[2] then
+    return 'blocked'
+end
+
+local stored = redis.call('HGET', KEYS[1], 'code')
+if not stored then
+    return 'expired'
+end
+
+-- Lua 5.1 interns every string, so this is a pointer comparison and
+-- its timing doesn't depend on how many characters match
+if stored ~= ARGV[1] then
+    -- fixed window: the TTL starts with the first failed attempt
+    local attempts = redis.call('INCR', KEYS[2])
+    if attempts == 1 then
+        redis.call('EXPIRE', KEYS[2], ARGV[2])
+    end
+
+    if attempts >= tonumber(ARGV[3]) then
+        local times = {}
+        for minutes in string.gmatch(ARGV[4], '%d+') do
+            table.insert(times, tonumber(minutes))
+        end
+        local level = math.min(tonumber(redis.call('GET', KEYS[5])) or 0, #times - 1)
+        local ttl = times[level + 1] * 60
+        redis.call('SET', KEYS[3], level + 1, 'EX', ttl)
+        redis.call('SET', KEYS[4], level + 1, 'EX', ttl)
+        redis.call('SET', KEYS[5], level + 1, 'EX', ttl + times[#times] * 60)
+        redis.call('DEL', KEYS[2])
+    end
+    return 'invalid'
+end
+
+redis.call('DEL', KEYS[2], KEYS[1])
+return 'ok'
+"""
+
+# Sent with EVALSHA, falling back to EVAL the first time the server lacks the script
+_send_code_script = REDIS.register_script(SEND_CODE_LUA)
+_verify_code_script = REDIS.register_script(VERIFY_CODE_LUA)
+
+async def send_2fa_code_via_email(user_id: int, email: str, background_tasks: BackgroundTasks):
     code = _generate_code()
-    entry = {
-        "code": code,
-        "last_sent": now.isoformat()
-    }
 
-    await REDIS.set(
-        _code_key(user.id),
-        json.dumps(entry),
-        ex=settings.TWO_FA_CODE_TTL_SECONDS
+    result = await _send_code_script(
+        keys=[_code_key(user_id)],
+        args=[code, int(time.time()), settings.TWO_FA_RESEND_SECONDS, settings.TWO_FA_CODE_TTL_SECONDS]
     )
-
-    # SEND EMAIL
-    from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-
-    conf = ConnectionConfig(
-        MAIL_USERNAME=settings.MAIL_USERNAME,
-        MAIL_PASSWORD=settings.MAIL_PASSWORD,
-        MAIL_FROM=settings.MAIL_FROM,
-        MAIL_PORT=settings.MAIL_PORT,
-        MAIL_SERVER=settings.MAIL_SERVER,
-        MAIL_STARTTLS=settings.MAIL_STARTTLS,
-        MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-        USE_CREDENTIALS=bool(settings.MAIL_USERNAME)
+    if result == b"too_soon":
+        raise HTTPException(
+            status_code=429,
+            detail="Please wait before requesting another code."
+        )
+
+    # SEND EMAIL (after the response, so SMTP latency isn't on the request path)
+    background_tasks.add_task(
+        send_mail,
+        email,
+        "Your verification code",
+        f"Your code is: {code}"
     )
 
-    fm = FastMail(conf)
-    msg = MessageSchema(
-        subject="Your verification code",
-        recipients=[user.email],
-        body=f"Your code is: {code}",
-        subtype="plain"
-    )
-    await fm.send_message(msg)
-
     return True
 
 def generate_tmp_token(user_id: int):
     payload = {
         "user_id": user_id,
         "type": "tmp_token",
-        "exp": datetime.utcnow() + timedelta(minutes=settings.TMP_TOKEN_EXPIRE_MINUTES)
+        "exp": int(time.time()) + settings.TMP_TOKEN_EXPIRE_MINUTES * 60
     }
-    return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+    return encode_hs256_token(payload)
+
+def decode_tmp_token(token: str) -> dict:
+    """
+    Decodes tmp_token, reusing the payload of recently decoded tokens.
+    
+    Raises:
+        jwt.ExpiredSignatureError: if token has expired
+        jwt.InvalidTokenError: if token is invalid
+    """
+    payload = _tmp_token_cache.get(token)
+
+    if payload is None:
+        payload = jwt.decode(
+            token,
+            SIGNING_KEY,
+            algorithms=["HS256"],
+            options={"require": ["exp", "user_id"]}
+        )
+        _tmp_token_cache[token] = payload
+    elif payload["exp"] <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+
+    return payload
 
 async def verify_code(user_id: int, code: str, ip: str):
-    # Check block
-    if await _is_blocked(user_id, ip):
-        raise HTTPException(status_code=403, detail="Too many attempts. Account temporarily blocked.")
+    if (user_id, code, ip) in _recent_verifications:
+        return True
+
+    result = await _verify_code_script(
+        keys=[
+            _code_key(user_id),
+            _attempt_key(user_id),
+            _block_user_key(user_id),
+            _block_ip_key(ip),
+            _block_level_key(user_id)
+        ],
+        args=[
+            code,
+            settings.TWO_FA_CODE_TTL_SECONDS,
+            settings.TWO_FA_MAX_ATTEMPTS,
+            _BLOCK_TIMES_ARG
+        ]
+    )
 
-    stored = await REDIS.get(_code_key(user_id))
-    if not stored:
+    if result == b"blocked":
+        raise HTTPException(status_code=403, detail="Too many attempts. Account temporarily blocked.")
+    if result == b"expired":
         raise HTTPException(status_code=400, detail="Code expired or not found.")
-
-    stored_code = json.loads(stored)["code"]
-
-    if stored_code != code:
-        attempts = await REDIS.incr(_attempt_key(user_id))
-        await REDIS.expire(_attempt_key(user_id), settings.TWO_FA_CODE_TTL_SECONDS)
-
-        if attempts >= settings.TWO_FA_MAX_ATTEMPTS:
-            await _increase_block(user_id, ip)
-
+    if result == b"invalid":
         raise HTTPException(status_code=400, detail="Invalid code.")
 
-    # SUCCESS — reset attempts
-    await REDIS.delete(_attempt_key(user_id))
-    await REDIS.delete(_code_key(user_id))
+    # SUCCESS — attempts and code already removed by the script
+    _recent_verifications[(user_id, code, ip)] = True
     return True
@@ -0,0 +1,95 @@
+"""
+Redis cache of authenticated users, keyed by email.
+
+Saves the per-request user SELECT in get_current_user. Entries live no
+longer than an access token and are dropped whenever the user changes.
+
+Invalidation leaves a short-lived tombstone instead of deleting the key:
+a request that read the user from the database just before the change
+would otherwise re-cache the old row afterwards (and keep a deleted or
+renamed user authenticated). cache_user only writes missing keys, so it
+can't overwrite the tombstone. A reader slower than TOMBSTONE_SECONDS
+between its SELECT and cache_user could still re-cache stale data.
+"""
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import get_settings
+from app.core.redis import REDIS
+from app.models.user import User
+
+settings = get_settings()
+
+# Marks a just-invalidated entry; treated as a miss and never overwritten
+_TOMBSTONE = b"-"
+TOMBSTONE_SECONDS = 30
+
+
+def _user_key(email: str) -> str:
+    return f"u:{email}"
+
+
+def _serialize(user: User) -> bytes:
+    # orjson writes datetimes natively as ISO 8601
+    return orjson.dumps({
+        "id": user.id,
+        "email": user.email,
+        "hashed_password": user.hashed_password,
+        "is_active": user.is_active,
+        "created_at": user.created_at,
+        "updated_at": user.updated_at,
+    })
+
+
+def _deserialize(raw: bytes) -> User:
+    data = orjson.loads(raw)
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    if data["updated_at"]:
+        data["updated_at"] = datetime.fromisoformat(data["updated_at"])
+    return User(**data)
+
+
+async def get_cached_user(db: AsyncSession, email: str) -> Optional[User]:
+    """
+    Returns the cached user attached to the given session, or None on miss.
+
+    A Redis failure is treated as a miss so authentication falls back to the database.
+    """
+    try:
+        raw = await REDIS.get(_user_key(email))
+    except RedisError:
+        return None
+
+    if raw is None or raw == _TOMBSTONE:
+        return None
+
+    user = _deserialize(raw)
+    # Mark as already persisted so merge() attaches it without a SELECT
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+async def cache_user(user: User) -> None:
+    """Stores the user for at most the lifetime of an access token (unless just invalidated)."""
+    try:
+        await REDIS.set(
+            _user_key(user.email),
+            _serialize(user),
+            ex=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+            nx=True
+        )
+    except RedisError:
+        pass
+
+
+async def invalidate_user(email: str) -> None:
+    """Replaces the cached entry with a tombstone, e.g. after the user was updated or deleted."""
+    try:
+        await REDIS.set(_user_key(email), _TOMBSTONE, ex=TOMBSTONE_SECONDS)
+    except RedisError:
+        pass
@@ -0,0 +1,16 @@
+"""
+Benchmarks for password hashing cost.
+
+Not collected by default - run explicitly on the target hardware:
+    pytest tests/bench_hash.py
+"""
+import pytest
+from argon2 import PasswordHasher
+
+
+@pytest.mark.parametrize("memory_cost", [19456, 47104])
+@pytest.mark.parametrize("time_cost", [1, 2, 3])
+def test_argon2_hash(benchmark, memory_cost, time_cost):
+    """Time a single Argon2id hash for the given parameters."""
+    hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=1)
+    benchmark(hasher.hash, "benchmarkpassword")
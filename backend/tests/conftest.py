@@ -1,50 +1,183 @@
 """
 Pytest configuration and fixtures for tests.
 """
+import os
+
+import fakeredis.aioredis
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.main import app
-from app.core.database import Base, get_db
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from app.core import redis as redis_module
+
+# In-memory Redis (Lua scripts included); swapped in before the services
+# import the shared client and register their scripts on it
+FAKE_REDIS = fakeredis.aioredis.FakeRedis()
+redis_module.REDIS = FAKE_REDIS
 
-# Test database (SQLite in-memory)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+from app.main import app  # noqa: E402
+from app.core.database import Base, get_db  # noqa: E402
+from app.core.security import create_access_token, get_password_hash  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services import twofa_service  # noqa: E402
 
-engine = create_engine(
+# Test database (SQLite file via aiosqlite), one file per xdist worker
+_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "")
+TEST_DB_FILE = f"./test{'_' + _WORKER if _WORKER else ''}.db"
+SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DB_FILE}"
+
+# NullPool: connections must not outlive the event loop that opened them
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    poolclass=NullPool
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# pysqlite's own transaction handling breaks SAVEPOINT; emit BEGIN ourselves
+@event.listens_for(engine.sync_engine, "connect")
+def _disable_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine.sync_engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+TEST_USER = {"email": "test@example.com", "password": "testpassword123"}
+
+
+async def _create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _drop_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """
+    FastAPI test client shared by the whole session.
+    One client means one event loop, which the database and fake Redis
+    connections stay bound to. Tables are created once per session (per worker).
+    """
+    with TestClient(app) as test_client:
+        test_client.portal.call(_create_tables)
+        yield test_client
+        test_client.portal.call(_drop_tables)
+    os.remove(TEST_DB_FILE)
+
+
+@pytest.fixture(scope="function")
+def db_connection(app_client):
+    """
+    Fixture holding one connection inside an outer transaction for the test.
+    Everything the test writes is rolled back at the end.
+    """
+    connection = app_client.portal.call(engine.connect().start)
+    transaction = app_client.portal.call(connection.begin().start)
+    try:
+        yield connection
+    finally:
+        app_client.portal.call(transaction.rollback)
+        app_client.portal.call(connection.close)
+
+
+def _session_factory(connection):
+    # commit() only releases a SAVEPOINT, the outer transaction stays open
+    return async_sessionmaker(
+        bind=connection,
+        autoflush=False,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint"
+    )
 
 
 @pytest.fixture(scope="function")
-def db_session():
+def db_session(app_client, db_connection):
     """
-    Fixture creating test database session.
-    Creates tables before test and removes them after completion.
+    Fixture creating test database session (runs on the client's event loop).
     """
-    Base.metadata.create_all(bind=engine)
-    session = TestingSessionLocal()
+    session = _session_factory(db_connection)()
     try:
         yield session
     finally:
-        session.close()
-        Base.metadata.drop_all(bind=engine)
+        app_client.portal.call(session.close)
 
 
 @pytest.fixture(scope="function")
-def client(db_session):
+def outbox(monkeypatch):
     """
-    Fixture creating FastAPI test client.
+    Fixture capturing 2FA emails instead of sending them over SMTP.
     """
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            db_session.close()
-    
+    sent = []
+
+    async def fake_send_mail(recipient: str, subject: str, body: str):
+        sent.append({"recipient": recipient, "subject": subject, "body": body})
+
+    monkeypatch.setattr(twofa_service, "send_mail", fake_send_mail)
+    return sent
+
+
+@pytest.fixture(scope="function")
+def client(app_client, db_connection, outbox):
+    """
+    Fixture providing the test client with a rolled-back database, empty Redis and caches.
+    """
+    TestingSessionLocal = _session_factory(db_connection)
+
+    async def override_get_db():
+        async with TestingSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
-    with TestClient(app) as test_client:
-        yield test_client
+    app_client.portal.call(FAKE_REDIS.flushall)
+    twofa_service._tmp_token_cache.clear()
+    twofa_service._recent_verifications.clear()
+    yield app_client
     app.dependency_overrides.clear()
+
+
+def last_code(outbox) -> str:
+    """Returns the 2FA code from the most recently sent email."""
+    return outbox[-1]["body"].rsplit(" ", 1)[-1]
+
+
+@pytest.fixture(scope="function")
+def registered_user(client):
+    """
+    Fixture registering the default test user.
+    """
+    response = client.post("/api/auth/register", json=TEST_USER)
+    assert response.status_code == 201
+    return {**TEST_USER, "id": response.json()["id"]}
+
+
+@pytest.fixture(scope="session")
+def test_user_password_hash():
+    """
+    Fixture hashing the default test user's password once per session.
+    """
+    return get_password_hash(TEST_USER["password"])
+
+
+@pytest.fixture(scope="function")
+def auth_headers(app_client, db_session, test_user_password_hash):
+    """
+    Fixture inserting the default test user directly and returning its auth header.
+    Skips register/login/2FA (and their password hashing) for tests that only
+    need an authenticated user.
+    """
+    async def create_user():
+        db_session.add(User(email=TEST_USER["email"], hashed_password=test_user_password_hash))
+        await db_session.commit()
+
+    app_client.portal.call(create_user)
+    token = create_access_token(data={"sub": TEST_USER["email"]})
+    return {"Authorization": f"Bearer {token}"}
@@ -1,8 +1,22 @@
 """
 Tests for authentication endpoints.
 """
+import bcrypt
 import pytest
 from fastapi import status
+from sqlalchemy import delete, select
+
+from app.core.config import get_settings
+from app.core.security import verify_password
+from app.models.user import User
+from app.services import twofa_service
+from tests.conftest import FAKE_REDIS, TEST_USER, last_code
+
+settings = get_settings()
+
+
+def _wrong_code(outbox) -> str:
+    return "000000" if last_code(outbox) != "000000" else "111111"
 
 
 class TestRegistration:
@@ -59,6 +73,18 @@ class TestRegistration:
         
         assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
     
+    def test_register_long_password(self, client):
+        """Test registration with a password longer than bcrypt's 72 bytes."""
+        response = client.post(
+            "/api/auth/register",
+            json={
+                "email": "test@example.com",
+                "password": "p" * 100
+            }
+        )
+        
+        assert response.status_code == status.HTTP_201_CREATED
+    
     def test_register_short_password(self, client):
         """Test registration with password that is too short."""
         response = client.post(
@@ -75,18 +101,8 @@ class TestRegistration:
 class TestLogin:
     """User login tests."""
     
-    def test_login_success(self, client):
-        """Test successful login."""
-        # First, register a user
-        client.post(
-            "/api/auth/register",
-            json={
-                "email": "test@example.com",
-                "password": "testpassword123"
-            }
-        )
-        
-        # Log in
+    def test_login_success(self, client, registered_user, outbox):
+        """Test successful login (first step - 2FA code is sent)."""
         response = client.post(
             "/api/auth/login",
             json={
@@ -97,23 +113,36 @@ class TestLogin:
         
         assert response.status_code == status.HTTP_200_OK
         data = response.json()
-        assert "access_token" in data
-        assert data["token_type"] == "bearer"
-        assert data["email"] == "test@example.com"
-        assert "user_id" in data
+        assert data["detail"] == "2fa_required"
+        assert "tmp_token" in data
+        assert len(outbox) == 1
+        assert outbox[0]["recipient"] == "test@example.com"
     
-    def test_login_wrong_password(self, client):
-        """Test login with incorrect password."""
-        # Register a user
-        client.post(
-            "/api/auth/register",
-            json={
-                "email": "test@example.com",
-                "password": "testpassword123"
-            }
-        )
+    def test_login_upgrades_legacy_hash(self, client, db_session, outbox):
+        """Test that logging in with a legacy bcrypt hash stores an Argon2id hash."""
+        legacy_hash = bcrypt.hashpw(TEST_USER["password"].encode(), bcrypt.gensalt(rounds=4)).decode()
+        
+        async def create_user():
+            db_session.add(User(email=TEST_USER["email"], hashed_password=legacy_hash))
+            await db_session.commit()
+        
+        async def stored_hash():
+            result = await db_session.execute(
+                select(User.hashed_password).where(User.email == TEST_USER["email"])
+            )
+            return result.scalar_one()
+        
+        client.portal.call(create_user)
+        
+        response = client.post("/api/auth/login", json=TEST_USER)
         
-        # Attempt to login with wrong password
+        assert response.status_code == status.HTTP_200_OK
+        new_hash = client.portal.call(stored_hash)
+        assert new_hash.startswith("$argon2id$")
+        assert verify_password(TEST_USER["password"], new_hash)
+    
+    def test_login_wrong_password(self, client, registered_user, outbox):
+        """Test login with incorrect password."""
         response = client.post(
             "/api/auth/login",
             json={
@@ -123,7 +152,8 @@ class TestLogin:
         )
         
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
-        assert "Invalid email or password" in response.json()["detail"]
+        assert "Invalid credentials" in response.json()["detail"]
+        assert outbox == []
     
     def test_login_nonexistent_user(self, client):
         """Test login of a non-existent user."""
@@ -136,7 +166,108 @@ class TestLogin:
         )
         
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
-        assert "Invalid email or password" in response.json()["detail"]
+        assert "Invalid credentials" in response.json()["detail"]
+
+
+class TestVerify2FA:
+    """2FA verification tests."""
+    
+    def test_verify_success(self, client, registered_user, outbox):
+        """Test verification with the emailed code."""
+        login_response = client.post("/api/auth/login", json=TEST_USER)
+        
+        response = client.post(
+            "/api/auth/verify-2fa",
+            json={
+                "tmp_token": login_response.json()["tmp_token"],
+                "code": last_code(outbox)
+            }
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert "access_token" in data
+        assert data["token_type"] == "bearer"
+    
+    def test_verify_wrong_code(self, client, registered_user, outbox):
+        """Test verification with an incorrect code."""
+        login_response = client.post("/api/auth/login", json=TEST_USER)
+        wrong_code = _wrong_code(outbox)
+        
+        response = client.post(
+            "/api/auth/verify-2fa",
+            json={
+                "tmp_token": login_response.json()["tmp_token"],
+                "code": wrong_code
+            }
+        )
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Invalid code."
+    
+    def test_verify_blocks_with_progressive_duration(self, client, registered_user, outbox):
+        """Test that repeated failures block the user, longer on each block."""
+        tmp_token = client.post("/api/auth/login", json=TEST_USER).json()["tmp_token"]
+        block_key = twofa_service._block_user_key(registered_user["id"])
+        
+        def fail_until_blocked():
+            for _ in range(settings.TWO_FA_MAX_ATTEMPTS):
+                response = client.post(
+                    "/api/auth/verify-2fa",
+                    json={"tmp_token": tmp_token, "code": _wrong_code(outbox)}
+                )
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
+            
+            response = client.post(
+                "/api/auth/verify-2fa",
+                json={"tmp_token": tmp_token, "code": last_code(outbox)}
+            )
+            assert response.status_code == status.HTTP_403_FORBIDDEN
+            return client.portal.call(FAKE_REDIS.ttl, block_key)
+        
+        assert fail_until_blocked() == 30 * 60
+        
+        # Let the first block lapse (user and ip keys), the level is kept
+        client.portal.call(
+            FAKE_REDIS.delete, block_key, twofa_service._block_ip_key("testclient")
+        )
+        
+        assert fail_until_blocked() == 60 * 60
+    
+    def test_resend_too_soon(self, client, registered_user, outbox):
+        """Test that a second login within the resend interval is throttled."""
+        client.post("/api/auth/login", json=TEST_USER)
+        
+        response = client.post("/api/auth/login", json=TEST_USER)
+        
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert len(outbox) == 1
+    
+    def test_verify_deleted_user(self, client, registered_user, outbox, db_session):
+        """Test verification for a user deleted between login and verification."""
+        tmp_token = client.post("/api/auth/login", json=TEST_USER).json()["tmp_token"]
+        
+        async def delete_user():
+            await db_session.execute(delete(User).where(User.id == registered_user["id"]))
+            await db_session.commit()
+        
+        client.portal.call(delete_user)
+        
+        response = client.post(
+            "/api/auth/verify-2fa",
+            json={"tmp_token": tmp_token, "code": last_code(outbox)}
+        )
+        
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_verify_invalid_tmp_token(self, client):
+        """Test verification with an invalid tmp_token."""
+        response = client.post(
+            "/api/auth/verify-2fa",
+            json={"tmp_token": "invalid_token", "code": "123456"}
+        )
+        
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
 class TestLogout:
@@ -0,0 +1,75 @@
+"""
+Tests for security helpers (password hashing, JWT).
+"""
+from datetime import datetime, timezone
+
+import bcrypt
+import jwt
+from argon2 import PasswordHasher
+
+from app.core.security import (
+    SIGNING_KEY,
+    create_access_token,
+    decode_access_token,
+    encode_hs256_token,
+    get_password_hash,
+    password_needs_rehash,
+    verify_password,
+)
+
+
+def _bcrypt_hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=4)).decode()
+
+
+class TestPasswords:
+    """Password hashing tests."""
+
+    def test_verify_argon2(self):
+        """Test verification of an Argon2id hash."""
+        hashed = get_password_hash("testpassword123")
+
+        assert hashed.startswith("$argon2id$")
+        assert verify_password("testpassword123", hashed)
+        assert not verify_password("wrongpassword", hashed)
+
+    def test_verify_legacy_bcrypt(self):
+        """Test verification of a legacy bcrypt hash."""
+        hashed = _bcrypt_hash("testpassword123")
+
+        assert hashed.startswith("$2b$")
+        assert verify_password("testpassword123", hashed)
+        assert not verify_password("wrongpassword", hashed)
+
+    def test_needs_rehash_legacy_bcrypt(self):
+        """Test that bcrypt hashes are flagged for rehashing."""
+        assert password_needs_rehash(_bcrypt_hash("testpassword123"))
+
+    def test_needs_rehash_current_argon2(self):
+        """Test that hashes with current parameters are kept."""
+        assert not password_needs_rehash(get_password_hash("testpassword123"))
+
+    def test_needs_rehash_outdated_argon2(self):
+        """Test that Argon2 hashes with other parameters are flagged for rehashing."""
+        weak_hash = PasswordHasher(time_cost=1, memory_cost=8192, parallelism=1).hash("testpassword123")
+
+        assert password_needs_rehash(weak_hash)
+
+
+class TestTokens:
+    """JWT creation tests."""
+
+    def test_access_token_datetime_claims(self):
+        """Test that datetime claims are encoded as timestamps."""
+        issued_at = datetime.now(timezone.utc)
+        token = create_access_token(data={"sub": "test@example.com", "iat": issued_at})
+
+        payload = jwt.decode(token, SIGNING_KEY, algorithms=["HS256"])
+        assert payload["iat"] == int(issued_at.timestamp())
+        assert decode_access_token(token) == "test@example.com"
+
+    def test_hs256_encoder_matches_pyjwt(self):
+        """Test that the precomputed-header encoder produces PyJWT-compatible tokens."""
+        payload = {"user_id": 1, "type": "tmp_token", "exp": 2_000_000_000}
+
+        assert encode_hs256_token(payload) == jwt.encode(payload, SIGNING_KEY, algorithm="HS256")
@@ -1,38 +1,27 @@
 """
 Tests for user endpoints.
 """
+from datetime import datetime, timezone
+
+import bcrypt
 import pytest
 from fastapi import status
+from sqlalchemy import event, select
+
+from app.core.security import create_access_token
+from app.models.user import User
+from app.services import user_cache
+from tests.conftest import FAKE_REDIS, TEST_USER, engine
 
 
 class TestUserProfile:
     """User profile tests."""
     
-    def test_get_profile_success(self, client):
+    def test_get_profile_success(self, client, auth_headers):
         """Test retrieving profile of a logged-in user."""
-        # Register a user
-        client.post(
-            "/api/auth/register",
-            json={
-                "email": "test@example.com",
-                "password": "testpassword123"
-            }
-        )
-        
-        # Log in
-        login_response = client.post(
-            "/api/auth/login",
-            json={
-                "email": "test@example.com",
-                "password": "testpassword123"
-            }
-        )
-        token = login_response.json()["access_token"]
-        
-        # Retrieve profile
         response = client.get(
             "/api/user/profile",
-            headers={"Authorization": f"Bearer {token}"}
+            headers=auth_headers
         )
         
         assert response.status_code == status.HTTP_200_OK
@@ -60,46 +49,48 @@ class TestUserProfile:
 class TestUserUpdate:
     """User profile update tests."""
     
-    def test_update_email(self, client):
+    def test_update_email(self, client, auth_headers):
         """Test updating email."""
-        # Registration and login
-        client.post(
-            "/api/auth/register",
-            json={"email": "test@example.com", "password": "testpassword123"}
-        )
-        login_response = client.post(
-            "/api/auth/login",
-            json={"email": "test@example.com", "password": "testpassword123"}
-        )
-        token = login_response.json()["access_token"]
-        
-        # Update email
         response = client.put(
             "/api/user/update",
-            headers={"Authorization": f"Bearer {token}"},
+            headers=auth_headers,
             json={"email": "newemail@example.com"}
         )
         
         assert response.status_code == status.HTTP_200_OK
         assert response.json()["email"] == "newemail@example.com"
     
-    def test_update_password(self, client):
-        """Test updating password."""
-        # Registration and login
-        client.post(
-            "/api/auth/register",
-            json={"email": "test@example.com", "password": "oldpassword123"}
-        )
-        login_response = client.post(
-            "/api/auth/login",
-            json={"email": "test@example.com", "password": "oldpassword123"}
+    def test_update_email_taken(self, client, auth_headers, db_session):
+        """Test updating email to an address used by another account."""
+        async def create_other_user():
+            db_session.add(User(email="other@example.com", hashed_password="unused"))
+            await db_session.commit()
+        
+        async def stored_emails():
+            result = await db_session.execute(select(User.email).order_by(User.id))
+            return result.scalars().all()
+        
+        client.portal.call(create_other_user)
+        
+        response = client.put(
+            "/api/user/update",
+            headers=auth_headers,
+            json={"email": "other@example.com"}
         )
-        token = login_response.json()["access_token"]
         
-        # Update password
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "already exists" in response.json()["detail"]
+        assert client.portal.call(stored_emails) == ["test@example.com", "other@example.com"]
+        
+        response = client.get("/api/user/profile", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["email"] == "test@example.com"
+    
+    def test_update_password(self, client, auth_headers):
+        """Test updating password."""
         response = client.put(
             "/api/user/update",
-            headers={"Authorization": f"Bearer {token}"},
+            headers=auth_headers,
             json={"password": "newpassword123"}
         )
         
@@ -111,3 +102,85 @@ class TestUserUpdate:
             json={"email": "test@example.com", "password": "newpassword123"}
         )
         assert login_response.status_code == status.HTTP_200_OK
+
+
+class TestUserCache:
+    """Cached authentication tests."""
+    
+    def test_profile_served_from_cache(self, client, auth_headers):
+        """Test that a repeated request authenticates without a user SELECT."""
+        client.get("/api/user/profile", headers=auth_headers)
+        
+        statements = []
+        
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        try:
+            response = client.get("/api/user/profile", headers=auth_headers)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["email"] == "test@example.com"
+        assert not [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    
+    def test_old_email_token_rejected_after_email_change(self, client, auth_headers):
+        """Test that a token for the previous email stops working after an email change."""
+        client.get("/api/user/profile", headers=auth_headers)
+        
+        response = client.put(
+            "/api/user/update",
+            headers=auth_headers,
+            json={"email": "newemail@example.com"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        
+        response = client.get("/api/user/profile", headers=auth_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_token_rejected_after_delete(self, client, auth_headers):
+        """Test that a token stops working after the account is deleted."""
+        client.get("/api/user/profile", headers=auth_headers)
+        
+        response = client.delete("/api/user/delete", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        response = client.get("/api/user/profile", headers=auth_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_invalidated_user_not_recached(self, client, auth_headers):
+        """Test that a late cache write can't resurrect an invalidated entry."""
+        stale_user = User(
+            id=1,
+            email=TEST_USER["email"],
+            hashed_password="stale",
+            is_active=True,
+            created_at=datetime.now(timezone.utc),
+            updated_at=None
+        )
+        
+        client.portal.call(user_cache.invalidate_user, TEST_USER["email"])
+        client.portal.call(user_cache.cache_user, stale_user)
+        
+        cached = client.portal.call(FAKE_REDIS.get, user_cache._user_key(TEST_USER["email"]))
+        assert cached == user_cache._TOMBSTONE
+    
+    def test_login_rehash_drops_cached_user(self, client, db_session, outbox):
+        """Test that upgrading a legacy hash on login invalidates the cached user."""
+        legacy_hash = bcrypt.hashpw(TEST_USER["password"].encode(), bcrypt.gensalt(rounds=4)).decode()
+        
+        async def create_user():
+            db_session.add(User(email=TEST_USER["email"], hashed_password=legacy_hash))
+            await db_session.commit()
+        
+        client.portal.call(create_user)
+        token = create_access_token(data={"sub": TEST_USER["email"]})
+        client.get("/api/user/profile", headers={"Authorization": f"Bearer {token}"})
+        
+        response = client.post("/api/auth/login", json=TEST_USER)
+        assert response.status_code == status.HTTP_200_OK
+        
+        cached = client.portal.call(FAKE_REDIS.get, user_cache._user_key(TEST_USER["email"]))
+        assert cached == user_cache._TOMBSTONE